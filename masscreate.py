@@ -7,19 +7,48 @@ WireGuard Massenkonfigurations-Generator für WGDashboard-API.
 from __future__ import annotations
 
 import argparse
+import base64
 import configparser
 import getpass
+import io
 import json
 import os
+import re
 import shutil
 import sqlite3
 import subprocess
 import sys
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
-from urllib.error import URLError, HTTPError
-from urllib.request import Request, urlopen
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import (
+        Encoding,
+        NoEncryption,
+        PrivateFormat,
+        PublicFormat,
+    )
+except ImportError:  # Fallback auf `wg genkey`/`wg pubkey`
+    X25519PrivateKey = None  # type: ignore[assignment,misc]
+
+try:
+    from pydbus import SystemBus
+except ImportError:  # Fallback auf `systemctl`
+    SystemBus = None  # type: ignore[assignment,misc]
+
+try:
+    from pyroute2 import IPRoute
+    from pyroute2.netlink.exceptions import NetlinkError
+except ImportError:  # Fallback auf `ip route`
+    IPRoute = None  # type: ignore[assignment,misc]
 
 # Farbcodes (wie im alten Skript)
 RED = "\033[0;31m"
@@ -27,8 +56,17 @@ GREEN = "\033[0;32m"
 YELLOW = "\033[1;33m"
 CYAN = "\033[0;36m"
 NC = "\033[0m"
+if not sys.stdout.isatty():
+    # Keine Escape-Sequenzen in umgeleiteter Ausgabe (Logs, Pipes)
+    RED = GREEN = YELLOW = CYAN = NC = ""
 
 DEFAULT_CONFIG_PATH = "config.ini"
+REQUIRED_BINARIES = ("wg", "wg-quick", "ip", "systemctl")
+PEER_SECTION_RE = re.compile(r"^peer\.(.*)$", re.IGNORECASE)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Absolute Pfade der Binaries, gefüllt von check_dependencies()
+BINARIES: Dict[str, str] = {}
 
 
 # Hilfsfunktionen
@@ -40,6 +78,8 @@ def run_cmd(
     input_data: bytes | None = None,
 ) -> subprocess.CompletedProcess:
     """Wrapper um subprocess.run mit vereinheitlichter Fehlerbehandlung."""
+    # Vorab aufgelöster Pfad erspart die PATH-Suche bei jedem exec
+    cmd = [BINARIES.get(cmd[0], cmd[0]), *cmd[1:]]
     return subprocess.run(
         cmd,
         check=check,
@@ -51,9 +91,12 @@ def run_cmd(
 
 def check_dependencies() -> None:
     missing = []
-    for binary in ("wg", "wg-quick", "ip", "systemctl"):
-        if shutil.which(binary) is None:  # type: ignore[name-defined]
+    for binary in REQUIRED_BINARIES:
+        path = shutil.which(binary)
+        if path is None:
             missing.append(binary)
+        else:
+            BINARIES[binary] = path
     if missing:
         print(f"{RED}Fehler: Fehlende Abhängigkeiten: {', '.join(missing)}{NC}")
         sys.exit(1)
@@ -67,22 +110,64 @@ def prompt_if_empty(value: str | None, prompt_text: str, secret: bool = False) -
     return input(prompt_text)
 
 
-def format_number(num: int, digits: int) -> str:
-    return f"{num:0{digits}d}"
+class DashboardSession:
+    """Persistente (keep-alive) HTTP-Verbindung zur WGDashboard-API."""
+
+    def __init__(self, url: str, api_key: str) -> None:
+        self.url = url
+        self.api_key = api_key
+        parts = urlsplit(url)
+        conn_cls = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        self.base_path = parts.path.rstrip("/")
+        self.headers = {**JSON_HEADERS, "wg-dashboard-apikey": api_key}
+        self.conn = conn_cls(parts.hostname or "localhost", parts.port)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        payload: Dict[str, Any] | None = None,
+        timeout: float = 10,
+    ) -> Tuple[int, bytes]:
+        body = json.dumps(payload).encode() if payload is not None else None
+        reused = self.conn.sock is not None
+        self.conn.timeout = timeout
+        if reused:
+            self.conn.sock.settimeout(timeout)
+        try:
+            return self._send(method, path, body)
+        except ConnectionError:  # inkl. RemoteDisconnected, BrokenPipeError
+            if not reused:
+                raise
+            # Server hat die Keep-alive-Verbindung geschlossen: einmal neu verbinden
+            self.conn.close()
+            return self._send(method, path, body)
+
+    def _send(self, method: str, path: str, body: bytes | None) -> Tuple[int, bytes]:
+        self.conn.request(method, self.base_path + path, body=body, headers=self.headers)
+        resp = self.conn.getresponse()
+        return resp.status, resp.read()
 
+    def clone(self) -> "DashboardSession":
+        """Eigene Verbindung mit gleichen Parametern (http.client ist nicht thread-safe)."""
+        return DashboardSession(self.url, self.api_key)
 
-def api_handshake(url: str, api_key: str, timeout: int = 5) -> bool:
-    req = Request(f"{url}/api/handshake", headers={"wg-dashboard-apikey": api_key})
+    def close(self) -> None:
+        # Nächster request() baut die Verbindung automatisch neu auf
+        self.conn.close()
+
+
+def api_handshake(session: DashboardSession, timeout: int = 5) -> bool:
     try:
-        with urlopen(req, timeout=timeout) as resp:
-            return resp.status == 200
-    except (URLError, HTTPError):
+        status, _ = session.request("GET", "/api/handshake", timeout=timeout)
+        return status == 200
+    except (OSError, HTTPException):
+        session.close()
         return False
 
 
 def update_wgdashboard_peer(
-    url: str,
-    api_key: str,
+    session: DashboardSession,
     config_name: str,
     peer_pubkey: str,
     peer_privkey: str,
@@ -94,38 +179,87 @@ def update_wgdashboard_peer(
     peer_keepalive: int,
     server_endpoint: str,
 ) -> bool:
-    payload = json.dumps(
-        {
-            "id": peer_pubkey,
-            "name": peer_name,
-            "private_key": peer_privkey,
-            "DNS": peer_dns,
-            "allowed_ip": peer_allowed_ips,
-            "endpoint_allowed_ip": endpoint_allowed_ips,
-            "preshared_key": "",
-            "mtu": peer_mtu,
-            "keepalive": peer_keepalive,
-            "remote_endpoint": server_endpoint,
-        }
-    ).encode()
-
-    req = Request(
-        f"{url}/api/updatePeerSettings/{config_name}",
-        data=payload,
-        headers={
-            "wg-dashboard-apikey": api_key,
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
+    payload = {
+        "id": peer_pubkey,
+        "name": peer_name,
+        "private_key": peer_privkey,
+        "DNS": peer_dns,
+        "allowed_ip": peer_allowed_ips,
+        "endpoint_allowed_ip": endpoint_allowed_ips,
+        "preshared_key": "",
+        "mtu": peer_mtu,
+        "keepalive": peer_keepalive,
+        "remote_endpoint": server_endpoint,
+    }
     try:
-        with urlopen(req, timeout=10) as resp:
-            if resp.status != 200:
-                return False
-            body = json.loads(resp.read().decode() or "{}")
-            return bool(body.get("status") is True)
-    except (URLError, HTTPError, json.JSONDecodeError):
+        status, data = session.request("POST", f"/api/updatePeerSettings/{config_name}", payload)
+        if status != 200 or not data:
+            return False
+        # WGDashboard meldet Fehler mit HTTP 200 und "status": false, daher den Body
+        # prüfen; json.loads nimmt die Bytes direkt, ohne extra decode()
+        body = json.loads(data)
+        return isinstance(body, dict) and body.get("status") is True
+    except (OSError, HTTPException):
+        session.close()
         return False
+    except json.JSONDecodeError:
+        return False
+
+
+def update_wgdashboard_peers_batch(
+    sessions: List[DashboardSession],
+    config_name: str,
+    peers: List[Dict[str, str]],
+    default_name: str,
+    peer_dns: str,
+    endpoint_allowed_ips: str,
+    peer_mtu: int,
+    peer_keepalive: int,
+    server_endpoint: str,
+) -> List[bool]:
+    """Aktualisiere alle Peers einer Config; bis zu len(sessions) gleichzeitig.
+
+    Jede Session wird pro Runde von genau einem Thread benutzt (http.client ist nicht
+    thread-safe). Ergebnis in Reihenfolge von peers.
+    """
+
+    def update(peer: Dict[str, str], sess: DashboardSession) -> bool:
+        return update_wgdashboard_peer(
+            sess,
+            config_name,
+            peer["public_key"],
+            peer["private_key"],
+            peer.get("name") or default_name,
+            peer_dns,
+            peer["allowed_ips"],
+            endpoint_allowed_ips,
+            peer_mtu,
+            peer_keepalive,
+            server_endpoint,
+        )
+
+    if len(sessions) == 1 or len(peers) <= 1:
+        return [update(peer, sessions[0]) for peer in peers]
+
+    # Die WGDashboard-API kennt keinen Bulk-Endpoint, daher parallele Einzel-POSTs
+    results: List[bool] = []
+    with ThreadPoolExecutor(max_workers=len(sessions)) as pool:
+        for i in range(0, len(peers), len(sessions)):
+            results.extend(pool.map(update, peers[i : i + len(sessions)], sessions))
+    return results
+
+
+_IFACE_TPL = (
+    "[Interface]\n"
+    "Address = {address}\n"
+    "SaveConfig = true\n"
+    "PreUp =\n"
+    "PostUp =\n"
+    "PreDown =\n"
+    "PostDown =\n"
+    "ListenPort = {listen_port}\n"
+    "PrivateKey = {privkey}\n"
+)
 
 
 def create_config_text(
@@ -134,31 +268,52 @@ def create_config_text(
     interface_privkey: str,
     extra_peers: List[Dict[str, str]],
 ) -> str:
-    lines: List[str] = [
-        "[Interface]",
-        f"Address = {address}",
-        "SaveConfig = true",
-        "PreUp =",
-        "PostUp =",
-        "PreDown =",
-        "PostDown =",
-        f"ListenPort = {listen_port}",
-        f"PrivateKey = {interface_privkey}",
-        "",
-    ]
-    for peer in extra_peers:
-        lines.append("[Peer]")
-        lines.append(f"PublicKey = {peer['public_key']}")
-        lines.append(f"AllowedIPs = {peer['allowed_ips']}")
-        if peer.get("endpoint"):
-            lines.append(f"Endpoint = {peer['endpoint']}")
-        if peer.get("keepalive"):
-            lines.append(f"PersistentKeepalive = {peer['keepalive']}")
-        lines.append("")
-    return "\n".join(lines)
+    peer_blocks = "".join(
+        f"\n[Peer]\nPublicKey = {peer['public_key']}\nAllowedIPs = {peer['allowed_ips']}\n"
+        + (f"Endpoint = {peer['endpoint']}\n" if peer.get("endpoint") else "")
+        + (f"PersistentKeepalive = {peer['keepalive']}\n" if peer.get("keepalive") else "")
+        for peer in extra_peers
+    )
+    return _IFACE_TPL.format(address=address, listen_port=listen_port, privkey=interface_privkey) + peer_blocks
+
+
+def write_secure(path: Path, data: str, mode: int = 0o600) -> None:
+    """Schreibe Datei, die direkt mit mode angelegt wird (kein chmod-Fenster)."""
+    # Direkt per os.write: kein Dateiobjekt, kein fstat/lseek, ein write() je Config
+    view = memoryview(data.encode())
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def publish_staged(staging: Path, target_dir: Path) -> List[str]:
+    """Verschiebe die Dateien aus staging einzeln per rename nach target_dir.
+
+    Gibt die Namen der veröffentlichten Dateien zurück; danach ein fsync des Verzeichnisses.
+    """
+    published: List[str] = []
+    for entry in os.scandir(staging):
+        try:
+            os.replace(entry.path, target_dir / entry.name)
+        except OSError as exc:
+            print(f"  {RED}Fehler beim Verschieben nach {target_dir / entry.name}: {exc}{NC}")
+            continue
+        published.append(entry.name)
+    dir_fd = os.open(target_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return published
 
 
 def interface_running(name: str) -> bool:
+    if sys.platform.startswith("linux"):
+        # Ein stat() statt eines `ip link show`-Prozesses
+        return os.path.isdir(f"/sys/class/net/{name}")
     return run_cmd(["ip", "link", "show", name], check=False, capture=True).returncode == 0
 
 
@@ -177,18 +332,43 @@ def stop_interface(name: str) -> None:
 
 
 def delete_interface_and_routes(name: str, peer_allowed_ips: str) -> None:
-    # Interface stoppen und löschen
-    stop_interface(name)
-    run_cmd(["ip", "link", "delete", name], check=False, capture=True)
-    # Routen entfernen, soweit sie bekannt sind
-    for raw_ip in peer_allowed_ips.split(","):
-        ip_cidr = raw_ip.strip()
-        if not ip_cidr:
-            continue
-        run_cmd(["ip", "-4", "route", "delete", ip_cidr, "dev", name], check=False, capture=True)
+    ip_cidrs = [raw_ip.strip() for raw_ip in peer_allowed_ips.split(",") if raw_ip.strip()]
+    if IPRoute is None:
+        # Interface stoppen und löschen
+        stop_interface(name)
+        if interface_running(name):
+            run_cmd(["ip", "link", "delete", name], check=False, capture=True)
+        # Routen entfernen, soweit sie bekannt sind
+        for ip_cidr in ip_cidrs:
+            run_cmd(["ip", "-4", "route", "delete", ip_cidr, "dev", name], check=False, capture=True)
+        return
+
+    # Ein Netlink-Socket für Link-Lookup und alle Routen statt eines `ip`-Prozesses je Route
+    with IPRoute() as ipr:
+        indices = ipr.link_lookup(ifname=name)
+        stop_interface(name)
+        if not indices:
+            return
+        if interface_running(name):
+            try:
+                ipr.link("del", index=indices[0])
+            except NetlinkError:
+                pass
+        for ip_cidr in ip_cidrs:
+            try:
+                ipr.route("del", dst=ip_cidr, oif=indices[0])
+            except NetlinkError:
+                pass
 
 
 def generate_keypair() -> Tuple[str, str]:
+    """Erzeuge ein WireGuard-Schlüsselpaar (Base64), bevorzugt ohne Subprozess."""
+    if X25519PrivateKey is not None:
+        key = X25519PrivateKey.generate()
+        priv_raw = key.private_bytes(Encoding.Raw, PrivateFormat.Raw, NoEncryption())
+        pub_raw = key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        return base64.b64encode(priv_raw).decode(), base64.b64encode(pub_raw).decode()
+
     priv = run_cmd(["wg", "genkey"], capture=True).stdout.strip()
     # wg pubkey liest den PrivateKey über stdin; als Bytes übergeben
     pub = run_cmd(
@@ -199,6 +379,34 @@ def generate_keypair() -> Tuple[str, str]:
     return priv, pub.decode()
 
 
+def generate_keypairs_bulk(n: int) -> List[Tuple[str, str]]:
+    """Erzeuge n Schlüsselpaare; ohne cryptography in einem einzigen Shell-Aufruf."""
+    if n <= 0:
+        return []
+    if X25519PrivateKey is not None:
+        return [generate_keypair() for _ in range(n)]
+    # wg pubkey akzeptiert nur einen Key pro Aufruf, daher Schleife innerhalb einer Shell
+    script = (
+        f"for i in $(seq 1 {n}); do "
+        'k=$(wg genkey) && printf "%s %s\\n" "$k" "$(printf "%s\\n" "$k" | wg pubkey)" || exit 1; '
+        "done"
+    )
+    lines = run_cmd(["sh", "-c", script], capture=True).stdout.split("\n")
+    pairs = [tuple(line.split()) for line in lines if line.strip()]
+    if len(pairs) != n or any(len(pair) != 2 for pair in pairs):
+        raise ValueError(f"{n} Schlüsselpaare erwartet, {len(pairs)} erhalten")
+    return pairs  # type: ignore[return-value]
+
+
+def clear_tables(conn: sqlite3.Connection, tables: List[str]) -> None:
+    """Leere alle Tabellen in einer einzigen Transaktion (ein Skript, ein Commit)."""
+    if not tables:
+        return
+    quoted = ['"' + t.replace('"', '""') + '"' for t in tables]
+    statements = "".join(f"DELETE FROM {q};" for q in quoted)
+    conn.executescript(f"BEGIN;{statements}COMMIT;")
+
+
 def purge_wgdashboard_tables(db_path: Path, pattern: str = "APW%") -> List[str]:
     cleared: List[str] = []
     if not db_path.exists():
@@ -210,10 +418,8 @@ def purge_wgdashboard_tables(db_path: Path, pattern: str = "APW%") -> List[str]:
         cur = conn.cursor()
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ?", (pattern,))
         tables = [row[0] for row in cur.fetchall()]
-        for table in tables:
-            cur.execute(f'DELETE FROM "{table}"')
-            cleared.append(table)
-        conn.commit()
+        clear_tables(conn, tables)
+        cleared.extend(tables)
     finally:
         conn.close()
     return cleared
@@ -232,24 +438,73 @@ def purge_wgdashboard_tables_for(db_path: Path, names: List[str]) -> List[str]:
         query = "SELECT name FROM sqlite_master WHERE type='table' AND (" + " OR ".join(["name LIKE ?"] * len(patterns)) + ")"
         cur.execute(query, patterns)
         tables = [row[0] for row in cur.fetchall()]
-        for table in tables:
-            cur.execute(f'DELETE FROM "{table}"')
-            cleared.append(table)
-        conn.commit()
+        clear_tables(conn, tables)
+        cleared.extend(tables)
     finally:
         conn.close()
     return cleared
 
 
+def wait_until(
+    predicate: Callable[[], bool],
+    timeout: float = 5,
+    initial: float = 0.05,
+    factor: float = 1.5,
+) -> bool:
+    """Prüfe predicate mit wachsendem Abstand, bis es True liefert oder timeout abläuft."""
+    end_time = time.monotonic() + timeout
+    delay = initial
+    while True:
+        if predicate():
+            return True
+        remaining = end_time - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay *= factor
+
+
+@lru_cache(maxsize=None)
+def systemd_bus() -> Tuple[Any, Any] | None:
+    """Einmalige D-Bus-Verbindung zu systemd; None ohne pydbus oder System-Bus."""
+    if SystemBus is None:
+        return None
+    try:
+        bus = SystemBus()
+        return bus, bus.get(".systemd1")
+    except Exception:  # GLib.Error u.a., dann eben systemctl
+        return None
+
+
+def systemd_unit(name: str) -> Any | None:
+    systemd = systemd_bus()
+    if systemd is None:
+        return None
+    bus, manager = systemd
+    unit_name = name if "." in name else f"{name}.service"
+    try:
+        return bus.get(".systemd1", manager.LoadUnit(unit_name))
+    except Exception:
+        return None
+
+
 def restart_service(name: str, action: str) -> bool:
+    # Bewusst systemctl: es wartet, bis der Job abgeschlossen ist (D-Bus nur fürs Polling)
     return run_cmd(["systemctl", action, name], check=False).returncode == 0
 
 
 def ensure_service_active(name: str, timeout: int = 10, interval: float = 1.0) -> bool:
     """Warte bis ein systemd Service aktiv ist."""
+    unit = systemd_unit(name)
     end_time = time.time() + timeout
     while time.time() < end_time:
-        if run_cmd(["systemctl", "is-active", "--quiet", name], check=False).returncode == 0:
+        if unit is not None:
+            try:
+                if unit.ActiveState == "active":
+                    return True
+            except Exception:
+                unit = None
+        if unit is None and run_cmd(["systemctl", "is-active", "--quiet", name], check=False).returncode == 0:
             return True
         time.sleep(interval)
     return False
@@ -333,24 +588,25 @@ def load_config(path: Path) -> Dict[str, Any]:
     # Zusätzliche Peers aus Sektionen [peer.<name>]
     extra_peers: List[Dict[str, str]] = []
     for sec_name in parser.sections():
-        if sec_name.lower().startswith("peer."):
-            sec = parser[sec_name]
-            allowed_ips = sec.get("allowed_ips", "").strip()
-            endpoint = sec.get("endpoint", "").strip()
-            keepalive = sec.get("keepalive", "").strip()
-            name = sec_name.split(".", 1)[1] if "." in sec_name else sec_name
-            if not allowed_ips:
-                print(f"{RED}Fehler: peer-Sektion '{sec_name}' benötigt allowed_ips.{NC}")
-                sys.exit(1)
-            extra_peers.append(
-                {
-                    "name": name,
-                    "public_key": sec.get("public_key", "").strip(),  # optional, wird bei Generierung ersetzt
-                    "allowed_ips": allowed_ips,
-                    "endpoint": endpoint,
-                    "keepalive": keepalive,
-                }
-            )
+        match = PEER_SECTION_RE.match(sec_name)
+        if match is None:
+            continue
+        sec = parser[sec_name]
+        allowed_ips = sec.get("allowed_ips", "").strip()
+        endpoint = sec.get("endpoint", "").strip()
+        keepalive = sec.get("keepalive", "").strip()
+        if not allowed_ips:
+            print(f"{RED}Fehler: peer-Sektion '{sec_name}' benötigt allowed_ips.{NC}")
+            sys.exit(1)
+        extra_peers.append(
+            {
+                "name": match.group(1),
+                "public_key": sec.get("public_key", "").strip(),  # optional, wird bei Generierung ersetzt
+                "allowed_ips": allowed_ips,
+                "endpoint": endpoint,
+                "keepalive": keepalive,
+            }
+        )
     cfg["extra_peers"] = extra_peers
     if not extra_peers:
         print(f"{RED}Fehler: Mindestens ein Peer muss in der ini definiert sein (Sektion [peer.<name>]).{NC}")
@@ -359,6 +615,28 @@ def load_config(path: Path) -> Dict[str, Any]:
     return cfg
 
 
+def format_key_summary(summary: List[Tuple[str, str, List[Dict[str, str]]]]) -> str:
+    """Übersicht der generierten Schlüssel als ein zusammenhängender Text."""
+    out = io.StringIO()
+    out.write("========================================\n")
+    out.write(" Generierte Schlüssel\n")
+    out.write("========================================\n\n")
+    for (config_name, interface_pub, peers_for_conf) in summary:
+        out.write(f"# {config_name}\n")
+        out.write(f"#   Interface-PubKey: {interface_pub}\n")
+        for peer in peers_for_conf:
+            out.write(f"#   Peer ({peer.get('name','')}):\n")
+            out.write(f"#     PublicKey:  {peer['public_key']}\n")
+            out.write(f"#     PrivateKey: {peer['private_key']}\n")
+            out.write(f"#     AllowedIPs: {peer['allowed_ips']}\n")
+            if peer.get("endpoint"):
+                out.write(f"#     Endpoint:   {peer['endpoint']}\n")
+            if peer.get("keepalive"):
+                out.write(f"#     Keepalive:  {peer['keepalive']}\n")
+        out.write("\n")
+    return out.getvalue()
+
+
 def parse_args(defaults: Dict[str, Any], argv: List[str], config_path: Path) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="WireGuard Massenkonfigurations-Generator mit WGDashboard-Integration",
@@ -384,6 +662,7 @@ def parse_args(defaults: Dict[str, Any], argv: List[str], config_path: Path) ->
     parser.add_argument("--peer-mtu", type=int, default=defaults["peer_mtu"], help="MTU für Client")
     parser.add_argument("--peer-keepalive", type=int, default=defaults["peer_keepalive"], help="PersistentKeepalive für Client")
     parser.add_argument("--endpoint-allowed-ips", default=defaults["endpoint_allowed_ips"], help="AllowedIPs in Client-Konfig")
+    parser.add_argument("--api-workers", type=int, default=1, help="Parallele Peer-Updates je Config (>1 nur, wenn WGDashboard parallele Updates derselben Config verträgt)")
     parser.add_argument("--delete-only", action="store_true", help="Nur löschen (angegebener Bereich): wg-quick down, Routen entfernen, .conf löschen, DB-Tabellen leeren")
     return parser.parse_args(argv)
 
@@ -419,11 +698,16 @@ def main() -> None:
     if not api_key:
         print(f"{RED}Fehler: API-Key erforderlich!{NC}")
         sys.exit(1)
+    if args.api_workers < 1:
+        print(f"{RED}Fehler: --api-workers muss mindestens 1 sein!{NC}")
+        sys.exit(1)
 
     # Einstellungen
     target_dir = Path(args.target_dir)
     digits = max(len(start_num_str), len(end_num_str))
-    names_in_scope = {f"{prefix}{format_number(i, digits)}" for i in range(start_num, end_num + 1)}
+    # Alle Config-Namen einmal vorab (führende Nullen via zfill)
+    config_names = [f"{prefix}{str(i).zfill(digits)}" for i in range(start_num, end_num + 1)]
+    names_in_scope = set(config_names)
 
     print("\n========================================")
     print(" WireGuard Konfigurations-Generator")
@@ -445,8 +729,9 @@ def main() -> None:
     print("")
 
     # API Test
+    session = DashboardSession(args.dashboard_url, api_key)
     print("Teste API-Verbindung...", end=" ", flush=True)
-    if not api_handshake(args.dashboard_url, api_key):
+    if not api_handshake(session):
         print(f"{RED}Fehlgeschlagen{NC}")
         sys.exit(1)
     print(f"{GREEN}OK{NC}")
@@ -465,7 +750,7 @@ def main() -> None:
     if args.delete_only:
         if args.dry_run:
             print(f"{YELLOW}[DRY-RUN] Lösche Bereich {start_num}-{end_num} mit Präfix {prefix}{NC}")
-        names_to_delete = [f"{prefix}{format_number(i, digits)}" for i in range(start_num, end_num + 1)]
+        names_to_delete = config_names
         db_path = Path(args.dashboard_db)
         if not args.dry_run:
             cleared = purge_wgdashboard_tables_for(db_path, names_to_delete)
@@ -487,38 +772,55 @@ def main() -> None:
     if not args.dry_run:
         run_pre_creation_cleanup(Path(args.dashboard_db), args.dashboard_service)
 
+    # Vorhandene Konfigs einmal per scandir erfassen statt stat() je Config
+    try:
+        existing = {e.name[:-5] for e in os.scandir(target_dir) if e.name.endswith(".conf")}
+    except FileNotFoundError:
+        existing = set()
+
+    # Alle Schlüsselpaare vorab in einem Rutsch erzeugen (Interface + je ini-Peer)
+    # Nur für Configs, die tatsächlich erstellt werden (vorhandene werden übersprungen)
+    keys_per_config = 1 + len(extra_peers)
+    to_create = [n for n in config_names if args.delete_existing or n not in existing]
+    try:
+        keypairs = iter(generate_keypairs_bulk(len(to_create) * keys_per_config))
+    except (subprocess.CalledProcessError, ValueError) as exc:
+        # Jede betroffene Config wird unten als Fehler gezählt
+        print(f"{RED}Fehler bei Schlüsselerzeugung: {exc}{NC}")
+        keypairs = iter(())
+
     # Zähler
     total = created = skipped = errors = 0
     summary: List[Tuple[str, str, List[Dict[str, str]]]] = []
 
-    for i in range(start_num, end_num + 1):
-        total += 1
-        num = format_number(i, digits)
-        config_name = f"{prefix}{num}"
-        filepath = target_dir / f"{config_name}.conf"
+    # Konfigs zunächst in ein verstecktes Staging-Verzeichnis im Ziel (gleiches
+    # Dateisystem) schreiben und am Ende per rename veröffentlichen
+    staging = None if args.dry_run else Path(tempfile.mkdtemp(prefix=".masscreate-", dir=target_dir))
+    try:
+        for config_name in config_names:
+            total += 1
+            filepath = target_dir / f"{config_name}.conf"
 
-        print(f"{CYAN}[{config_name}]{NC}")
+            print(f"{CYAN}[{config_name}]{NC}")
 
-        if filepath.exists() and not args.delete_existing:
-            print(f"  {YELLOW}Existiert bereits, überspringe{NC}\n")
-            skipped += 1
-            continue
+            if config_name in existing and not args.delete_existing:
+                print(f"  {YELLOW}Existiert bereits, überspringe{NC}\n")
+                skipped += 1
+                continue
 
-        try:
-            interface_privkey, interface_pubkey = generate_keypair()
-        except subprocess.CalledProcessError as exc:
-            print(f"  {RED}Fehler bei Schlüsselerzeugung: {exc}{NC}")
-            errors += 1
-            continue
+            config_keys = list(islice(keypairs, keys_per_config))
+            if len(config_keys) < keys_per_config:
+                print(f"  {RED}Fehler bei Schlüsselerzeugung{NC}\n")
+                errors += 1
+                continue
+            (interface_privkey, interface_pubkey), *peer_keys = config_keys
 
-        print(f"  Interface-PrivKey: {interface_privkey[:15]}...")
-        print(f"  Interface-PubKey:  {interface_pubkey[:15]}...")
+            print(f"  Interface-PrivKey: {interface_privkey[:15]}...")
+            print(f"  Interface-PubKey:  {interface_pubkey[:15]}...")
 
-        # Peer-Schlüsselpaare pro ini-Peer generieren
-        peers_for_conf: List[Dict[str, str]] = []
-        try:
-            for peer in extra_peers:
-                priv, pub = generate_keypair()
+            # Peer-Schlüsselpaare pro ini-Peer zuordnen
+            peers_for_conf: List[Dict[str, str]] = []
+            for peer, (priv, pub) in zip(extra_peers, peer_keys):
                 peers_for_conf.append(
                     {
                         "name": peer.get("name", ""),
@@ -529,28 +831,37 @@ def main() -> None:
                         "keepalive": peer.get("keepalive", ""),
                     }
                 )
-        except subprocess.CalledProcessError as exc:
-            print(f"  {RED}Fehler bei Peer-Schlüsselerzeugung: {exc}{NC}")
-            errors += 1
-            continue
 
-        summary.append((config_name, interface_pubkey, peers_for_conf))
+            summary.append((config_name, interface_pubkey, peers_for_conf))
 
-        if args.dry_run:
-            print(f"  {YELLOW}[DRY-RUN] Würde erstellen: {filepath}{NC}\n")
-            created += 1
-            continue
+            if args.dry_run:
+                print(f"  {YELLOW}[DRY-RUN] Würde erstellen: {filepath}{NC}\n")
+                created += 1
+                continue
 
-        config_text = create_config_text(
-            args.address,
-            args.listen_port,
-            interface_privkey,
-            peers_for_conf,
-        )
-        filepath.write_text(config_text)
-        os.chmod(filepath, 0o600)
-        print(f"  {GREEN}Konfig erstellt: {filepath}{NC}\n")
-        created += 1
+            config_text = create_config_text(
+                args.address,
+                args.listen_port,
+                interface_privkey,
+                peers_for_conf,
+            )
+            write_secure(staging / filepath.name, config_text)
+            print(f"  Konfig vorbereitet: {filepath.name}\n")
+
+        if staging is not None:
+            staged = {name for name, _pub, _peers in summary}
+            published = {Path(name).stem for name in publish_staged(staging, target_dir)}
+            for config_name in config_names:
+                if config_name in published:
+                    print(f"  {GREEN}Konfig erstellt: {target_dir / f'{config_name}.conf'}{NC}")
+            print("")
+            created += len(published)
+            errors += len(staged - published)
+            # Nicht veröffentlichte Configs weder ans Dashboard melden noch auflisten
+            summary = [entry for entry in summary if entry[0] in published]
+    finally:
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
 
     # API Updates (alle Peers je Config werden ans Dashboard übertragen)
     if not args.dry_run and created > 0:
@@ -567,38 +878,44 @@ def main() -> None:
                 print(f"{RED}Fehler: {args.dashboard_service} läuft nach Restart nicht.{NC}")
                 sys.exit(1)
             print(f"{GREEN}Dienst aktiv.{NC}")
-            time.sleep(2)
+            # Alte Keep-alive-Verbindung ist nach dem Neustart ungültig
+            session.close()
+            if not wait_until(lambda: api_handshake(session), timeout=15):
+                print(f"{YELLOW}Warnung: API antwortet nach Restart noch nicht.{NC}")
 
         print("\nAktualisiere Peer-Einstellungen (alle Peers je Config)...\n")
 
         api_success = api_failed = 0
+        # Worker-Verbindungen einmal je Lauf, nicht je Config (Keep-alive bleibt erhalten)
+        sessions = [session] + [session.clone() for _ in range(args.api_workers - 1)]
+        # Bewusst sequentiell: alle Interfaces teilen Address und ListenPort, es kann
+        # immer nur eines laufen (ein zweites paralleles `wg-quick up` scheitert am
+        # belegten Port). Parallel wird nur innerhalb einer Config (Peers).
         for (config_name, _interface_pub, peers_for_conf) in summary:
             if not peers_for_conf:
                 continue
             print(f"  {config_name}: ", end="", flush=True)
-            time.sleep(3)
-            if not start_interface(config_name):
+            if not start_interface(config_name) or not wait_until(
+                lambda: interface_running(config_name)
+            ):
                 print(f"{RED}Interface-Start fehlgeschlagen{NC}")
                 api_failed += len(peers_for_conf)
                 continue
 
-            time.sleep(1)
-            for peer in peers_for_conf:
+            wait_until(lambda: api_handshake(session))
+            results = update_wgdashboard_peers_batch(
+                sessions,
+                config_name,
+                peers_for_conf,
+                args.peer_name,
+                args.peer_dns,
+                args.endpoint_allowed_ips,
+                args.peer_mtu,
+                args.peer_keepalive,
+                args.server_endpoint,
+            )
+            for peer, ok in zip(peers_for_conf, results):
                 peer_name = peer.get("name") or args.peer_name
-                ok = update_wgdashboard_peer(
-                    args.dashboard_url,
-                    api_key,
-                    config_name,
-                    peer["public_key"],
-                    peer["private_key"],
-                    peer_name,
-                    args.peer_dns,
-                    peer["allowed_ips"],
-                    args.endpoint_allowed_ips,
-                    args.peer_mtu,
-                    args.peer_keepalive,
-                    args.server_endpoint,
-                )
                 if ok:
                     print(f"{GREEN}[{peer_name}] OK{NC} ", end="", flush=True)
                     api_success += 1
@@ -608,34 +925,24 @@ def main() -> None:
             stop_interface(config_name)
             print("")
 
+        for worker_session in sessions[1:]:
+            worker_session.close()
         print(f"\nAPI-Updates: {api_success} erfolgreich, {api_failed} fehlgeschlagen")
 
-    # Zusammenfassung
-    print("\n========================================")
-    print(" Zusammenfassung")
-    print("========================================\n")
-    print(f"  Gesamt:        {total}")
-    print(f"  Erstellt:      {GREEN}{created}{NC}")
-    print(f"  Übersprungen:  {YELLOW}{skipped}{NC}")
-    print(f"  Fehler:        {RED}{errors}{NC}\n")
-
+    session.close()
+
+    # Zusammenfassung (als ein Block geschrieben statt vieler print-Aufrufe)
+    out = io.StringIO()
+    out.write("\n========================================\n")
+    out.write(" Zusammenfassung\n")
+    out.write("========================================\n\n")
+    out.write(f"  Gesamt:        {total}\n")
+    out.write(f"  Erstellt:      {GREEN}{created}{NC}\n")
+    out.write(f"  Übersprungen:  {YELLOW}{skipped}{NC}\n")
+    out.write(f"  Fehler:        {RED}{errors}{NC}\n\n")
     if summary:
-        print("========================================")
-        print(" Generierte Schlüssel")
-        print("========================================\n")
-        for (config_name, interface_pub, peers_for_conf) in summary:
-            print(f"# {config_name}")
-            print(f"#   Interface-PubKey: {interface_pub}")
-            for peer in peers_for_conf:
-                print(f"#   Peer ({peer.get('name','')}):")
-                print(f"#     PublicKey:  {peer['public_key']}")
-                print(f"#     PrivateKey: {peer['private_key']}")
-                print(f"#     AllowedIPs: {peer['allowed_ips']}")
-                if peer.get("endpoint"):
-                    print(f"#     Endpoint:   {peer['endpoint']}")
-                if peer.get("keepalive"):
-                    print(f"#     Keepalive:  {peer['keepalive']}")
-            print("")
+        out.write(format_key_summary(summary))
+    sys.stdout.write(out.getvalue())
 
     if args.dry_run:
         print(f"{YELLOW}DRY-RUN abgeschlossen. Keine Dateien wurden erstellt.{NC}")
@@ -644,6 +951,8 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    # Alles, was dieses Skript anlegt, nur für den Eigentümer lesbar
+    os.umask(0o077)
     try:
         check_dependencies()
         main()